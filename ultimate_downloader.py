@@ -1,20 +1,30 @@
 import os
+import errno
 import re
 import json
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import subprocess
 import shutil
+import sys
 import time
-from typing import Optional, Tuple, List, Dict, Any
+import random
+from typing import Optional, Tuple, List, Dict, Set, Deque, Any
 from dataclasses import dataclass, field, asdict
 from datetime import datetime
+from functools import lru_cache
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from threading import Lock
+from threading import Lock, Thread
+from queue import Queue
+from collections import deque
 from uuid import uuid4
 import ipywidgets as widgets
 from IPython.display import display, clear_output
 from urllib.parse import urlparse, unquote
 from google.colab import drive
+try: import orjson  # Optional: faster decoding of the larger API payloads (gofile folders, RD torrent list)
+except ImportError: orjson = None
 
 # --- COLAB SECRETS HELPER ---
 def get_colab_secret(key: str, default: str = "") -> str:
@@ -60,12 +70,28 @@ UD_CONFIG_PATH = f"{DRIVE_BASE}Ultimate Downloader/"  # Config folder for sessio
 DRIVE_TV_PATH = "TV Shows"
 DRIVE_MOVIE_PATH = "Movies"
 DRIVE_YOUTUBE_PATH = "YouTube"
+DRIVE_TV_DIR = f"{DRIVE_BASE}{DRIVE_TV_PATH}"
+DRIVE_MOVIE_DIR = f"{DRIVE_BASE}{DRIVE_MOVIE_PATH}"
+DRIVE_YOUTUBE_DIR = f"{DRIVE_BASE}{DRIVE_YOUTUBE_PATH}"
 MIN_FILE_SIZE_MB = 10
 KEEP_EXTENSIONS = {'.srt', '.ass', '.sub', '.vtt'}
+ARCHIVE_TOOLS = {'.rar': 'unrar', '.zip': '7z', '.7z': '7z'}  # Archive extension -> extractor
+EXTRACT_ROOT = f"{COLAB_ROOT}temp_extract"  # Staging for extraction (local disk; placed on the Drive mount, moves would become renames)
 SESSION_FILE = f"{UD_CONFIG_PATH}session.json"
 HISTORY_FILE = f"{UD_CONFIG_PATH}history.json"
+HISTORY_MAX_ENTRIES = 500  # Newest entries kept in history.json
 COOKIE_PATH = f"{COLAB_ROOT}cookies.txt"
+MEGA_SWEEP_SKIP = {'sample_data', '.config', 'drive', os.path.basename(EXTRACT_ROOT), os.path.basename(COOKIE_PATH)}  # COLAB_ROOT entries that aren't downloads
 MAX_CONCURRENT_DEFAULT = 3
+ARIA2_MAX_CONNECTIONS = 16  # Connections per host across all parallel downloads (aria2's -x cap is 16)
+PROGRESS_INTERVAL = 0.5  # Seconds between progress bar refreshes
+MAX_RESOLVE_WORKERS = 4  # Concurrent API lookups while building the queue
+DRIVE_MOVE_WORKERS = 4  # Extracted files copied into Drive side by side
+YTDLP_CONCURRENT_FRAGMENTS = 8  # DASH/HLS fragments yt-dlp fetches at once per video
+RD_API = "https://api.real-debrid.com/rest/1.0"
+RD_MAGNET_TIMEOUT = 60  # Seconds to wait for RD to cache a magnet
+RD_POLL_MAX_DELAY = 30  # Cap for the magnet status backoff
+RD_DEAD_STATUSES = {'magnet_error', 'error', 'virus', 'dead'}  # Torrent states that never reach 'downloaded'
 
 # Real-Debrid supported file hosts (route through RD when token available)
 RD_SUPPORTED_HOSTS = {
@@ -78,23 +104,83 @@ RD_SUPPORTED_HOSTS = {
     'vimeo.com', 'wetransfer.com', 'wipfiles.net', 'worldbytez.com', 'youporn.com',
 }
 
+# --- FILENAME PATTERNS ---
+# Compiled once at load; these run for every file we sanitize or route to Drive
+# Single-pass table: path-reserved chars and '_' -> ' ', non-whitespace control chars dropped;
+# str.split() then collapses whitespace runs without a regex pass
+_FILENAME_TRANS = {ord(c): ' ' for c in '<>:"/\\|?*_'}
+_FILENAME_TRANS.update({i: None for i in [*range(32), *range(127, 160)] if not chr(i).isspace()})  # C0, DEL, C1
+# Invisible format chars from scraped titles: zero-width space, BOM and bidi embeddings/isolates.
+# They'd make "same" names differ for duplicate checks (ZWJ/ZWNJ are kept - scripts and emoji need them)
+_FILENAME_TRANS.update({i: None for i in [0x200B, 0xFEFF, *range(0x202A, 0x202F), *range(0x2066, 0x206A)]})
+# Part markers in one scan: "Part 1"/"Pt.2" and the Chinese 上篇/中篇/下篇 (first/middle/last part)
+_RE_PART = re.compile(r'(?i)(?:Part|Pt)\.?\s*([12])\b|([上中下])篇')
+_PART_ONE = {'1', '上'}
+# Episode markers fused into one alternation: the leftmost hit wins, ties go to strict > loose > asian.
+# Added Vietnamese "Tập", Korean "화", and more flexible episode patterns
+_RE_EPISODE = re.compile(
+    r'(?P<strict>\bS(?P<s_season>\d{1,2})E(?P<s_episode>\d{1,2})\b)'
+    r'|(?P<loose>\b(?:Ep?|Episode|Tập|Tập phim|Folge|Capitulo|Cap)[ .\-_]?(?P<l_ep1>\d{1,3})\b|[|\-–—]\s*(?:Ep?|Episode|Tập)?\s*(?P<l_ep2>\d{1,3})\s*[|\]]?)'
+    r'|(?P<asian>第(?P<a_ep1>\d+)集|(?P<a_ep2>\d+)화)', re.I)
+_RE_YEAR = re.compile(r'\b(19|20)\d{2}\b')
+# clean_show_name cascade, in application order
+# Leading YouTube prefix (VIETSUB |, ENGSUB -, ...) or a technical tag anywhere, stripped in one scan.
+# Neither side looks behind, so this matches exactly what stripping the prefix and then the tags did.
+_RE_SHOW_TAGS = re.compile(r'(?i)^\s*(?:VIETSUB|VietSub|ENGSUB|EngSub|ENG\s*SUB|VIET\s*SUB|THUYẾT\s*MINH|RAW|FULL|HD)\s*[|｜:：\-–—]\s*'
+                           r'|\[?\s*(?:ENG\s*SUB|ENGSUB|FULL|WEB-?DL|WEBRip|BluRay|HDR|10bit|Atmos|DV|Vision|DDP\d\.\d|x265|HEVC|x264|H\.\d{3})\s*\]?')
+_RE_SHOW_RESOLUTION = re.compile(r'(?i)\b(2160p|1080p|720p|480p|4k|8k)\b')
+_SHOW_BRACKETS_TRANS = str.maketrans('[]()《》「」【】', ' ' * 10)
+_RE_SHOW_TRAILING_PIPE = re.compile(r'\s*[|｜]\s*$')
+_SHOW_SEPARATORS_TRANS = str.maketrans('|｜._-', '     ')
+_RE_SHOW_END_MARKER = re.compile(r'(?i)\s+\b(END|FINALE|FINAL)\b$')
+
+# Link routing: one scan per URL instead of a chain of substring checks
+LINK_HOST_KINDS = {
+    'mega.nz': 'mega', 'transfer.it': 'mega',
+    'youtube.com': 'youtube', 'youtu.be': 'youtube', 'vimeo.com': 'youtube', 'twitch.tv': 'youtube',
+    'gofile.io': 'gofile', 'pixeldrain.com': 'pixeldrain', 'mediafire.com': 'mediafire',
+    '1fichier.com': '1fichier', 'magnet:?': 'magnet', 'real-debrid.com/d/': 'rd',
+}
+_RE_LINK_HOST = re.compile(f"({'|'.join(re.escape(h) for h in LINK_HOST_KINDS)})", re.I)
+_RE_GOFILE_ID = re.compile(r'gofile\.io/d/([a-zA-Z0-9]+)')
+_RE_PIXELDRAIN_ID = re.compile(r'pixeldrain\.com/u/([a-zA-Z0-9]+)')
+# Resolver page scraping
+_RE_MEDIAFIRE_LINK = re.compile(r'href="(https://download\d*\.mediafire\.com/[^"]+)"')
+_RE_MEDIAFIRE_ALT_LINK = re.compile(r'aria-label="Download file"\s+href="([^"]+)"')
+_RE_HTML_TITLE = re.compile(r'<title>([^<]+)</title>')
+_RE_TITLE_PREFIX = re.compile(r'^.*?:\s*')
+_RE_1FICHIER_LINK = re.compile(r'href="(https://[^"]*1fichier[^"]*)"[^>]*>Click here', re.IGNORECASE)
+# Downloader progress readouts (parsed at most every PROGRESS_INTERVAL)
+_RE_ARIA2_PERCENT = re.compile(r'\((\d+)%\)')
+_RE_ARIA2_SPEED = re.compile(r'DL:(\d+\.?\d*[KMG]iB/s)')
+_RE_MEGA_PERCENT = re.compile(r'(\d+\.\d+)%')
+_RE_MEGA_SPEED = re.compile(r'(\d+\.?\d*\s*[KMG]B/s)')
+_RE_STATUS_PERCENT = re.compile(r'(\d+)%')  # active_downloads entries like "45% (5.2MiB/s)"
+# Tool requirements for a batch, checked against all URLs at once
+_RE_YTDLP_HOST = re.compile(r'youtube\.com|youtu\.be|twitch\.tv|tiktok\.com|vimeo\.com|dailymotion\.com|soundcloud\.com')
+_RE_ARIA_HOST = re.compile(r'gofile\.io|pixeldrain\.com|magnet:|real-debrid')
+_RE_RD_HOST = re.compile('|'.join(re.escape(h) for h in RD_SUPPORTED_HOSTS))  # One scan instead of a substring test per host
+
 # --- DOWNLOAD TASK DATACLASS ---
 @dataclass
 class DownloadTask:
     url: str  # Direct download URL (may be resolved API URL)
     filename: str
     source: str
-    link_type: str  # gofile, pixeldrain, direct, youtube, mega, rd
+    link_type: str  # gofile, pixeldrain, direct, youtube, mega, rd, magnet
     id: str = field(default_factory=lambda: str(uuid4()))  # Unique ID for tracking
-    status: str = "pending"  # pending, downloading, done, failed, skipped
+    status: str = "pending"  # pending, downloading, processing, done, failed, skipped
     error: Optional[str] = None
     cookie: Optional[str] = None
     original_url: Optional[str] = None  # Original user-provided URL (for re-resolving on resume)
 
 # --- THREAD SAFETY ---
 progress_lock = Lock()
+history_lock = Lock()  # history.json is read-modify-written; post-processing and RD/Mega stages may log at once
+history_cache: Optional[Deque[Dict[str, Any]]] = None  # history.json as last written, so each log is a write without a Drive read
 active_downloads: Dict[str, str] = {}  # task_id -> status string
 stop_monitor = False  # Flag to stop progress monitor thread
+known_dirs: Set[str] = set()  # Directories already confirmed on Drive (each check is a FUSE round-trip)
 
 # --- UI ELEMENTS ---
 token_gf = widgets.Text(description='Gofile:', placeholder='Optional (Required for private)', value=get_colab_secret('GOFILE_TOKEN'))
@@ -205,9 +291,10 @@ yt_fail_cumulative = 0
 def load_session() -> Optional[Dict[str, Any]]:
     """Load previous session from Drive if it exists."""
     try:
-        if os.path.exists(SESSION_FILE):
-            with open(SESSION_FILE, 'r') as f:
-                return json.load(f)
+        with open(SESSION_FILE, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        pass
     except Exception as e:
         print(f"⚠️ Could not load session: {e}")
     return None
@@ -231,11 +318,19 @@ def save_session(tasks: List[DownloadTask], gofile_token: str = "", rd_token: st
     except Exception as e:
         print(f"⚠️ Could not save session: {e}")
 
+def count_results(tasks: List[DownloadTask], yt_success: int, yt_fail: int) -> Tuple[int, int]:
+    """(succeeded, failed) in one pass. YouTube tasks are playlists, so their per-video cumulative counts replace them."""
+    done = failed = 0
+    for t in tasks:
+        if t.link_type == 'youtube': continue
+        if t.status == 'done': done += 1
+        elif t.status == 'failed': failed += 1
+    return done + yt_success, failed + yt_fail
+
 def clear_session():
     """Delete session file after successful completion."""
     try:
-        if os.path.exists(SESSION_FILE):
-            os.remove(SESSION_FILE)
+        os.remove(SESSION_FILE)
     except Exception:
         pass
 
@@ -249,25 +344,28 @@ def check_resume_available():
 # --- DOWNLOAD HISTORY ---
 def log_download(filename: str, source: str, size_mb: float, destination: str, status: str = "success"):
     """Append download to persistent history log for debugging."""
+    entry = {
+        "timestamp": datetime.now().isoformat(),
+        "filename": filename,
+        "source": source,
+        "size_mb": round(size_mb, 2),
+        "destination": destination,
+        "status": status
+    }
+    global history_cache
     try:
-        history = []
-        if os.path.exists(HISTORY_FILE):
-            with open(HISTORY_FILE, 'r') as f:
-                history = json.load(f)
-        
-        entry = {
-            "timestamp": datetime.now().isoformat(),
-            "filename": filename,
-            "source": source,
-            "size_mb": round(size_mb, 2),
-            "destination": destination,
-            "status": status
-        }
-        history.insert(0, entry)  # Newest first
-        history = history[:500]   # Keep last 500 entries
-        
-        with open(HISTORY_FILE, 'w') as f:
-            json.dump(history, f, indent=2)
+        with history_lock:
+            if history_cache is None:
+                # Read from Drive once per session; later entries are added to the in-memory copy
+                try:
+                    with open(HISTORY_FILE, 'r') as f:
+                        # The file is newest first: keep its head, a bounded deque would keep the tail
+                        history_cache = deque(json.load(f)[:HISTORY_MAX_ENTRIES], maxlen=HISTORY_MAX_ENTRIES)
+                except FileNotFoundError:
+                    history_cache = deque(maxlen=HISTORY_MAX_ENTRIES)
+            history_cache.appendleft(entry)  # Newest first; the oldest falls off the end without a list shift
+            with open(HISTORY_FILE, 'w') as f:
+                json.dump(list(history_cache), f, indent=2)
     except Exception:
         pass  # Silent fail for logging
 
@@ -279,13 +377,15 @@ def view_history(b=None):
         try:
             with open(HISTORY_FILE, 'r') as f:
                 history = json.load(f)
-            print(f"\\n📊 Last 10 downloads (times in UTC):")
+            # Build the listing first and print it in one call
+            lines = [f"\\n📊 Last 10 downloads (times in UTC):"]
             for i, entry in enumerate(history[:10], 1):
                 ts = entry.get('timestamp', '')[:16].replace('T', ' ')
                 fn = entry.get('filename', 'Unknown')[:40]
                 src = entry.get('source', '?')
                 size = entry.get('size_mb', 0)
-                print(f"   {i}. [{ts}] {fn} ({src}, {size:.1f}MB)")
+                lines.append(f"   {i}. [{ts}] {fn} ({src}, {size:.1f}MB)")
+            print("\n".join(lines))
         except Exception as e:
             print(f"   ⚠️ Could not read history: {e}")
     else:
@@ -318,8 +418,7 @@ def upload_cookies(b=None):
         if uploaded:
             # Move uploaded file to cookies.txt
             for filename in uploaded.keys():
-                import shutil
-                shutil.move(filename, COOKIE_PATH)
+                move_file(filename, COOKIE_PATH)
                 settings_status.value = f"<span style='color:green'>✅ Cookies uploaded from {filename}</span>"
                 break
         else:
@@ -400,12 +499,14 @@ def request_clear_session(b=None):
 
 def _do_clear_history():
     """Actually clear the download history file."""
+    global history_cache
     try:
-        if os.path.exists(HISTORY_FILE):
+        with history_lock:
+            history_cache = deque(maxlen=HISTORY_MAX_ENTRIES)  # Otherwise the next log would write the cleared entries back
             os.remove(HISTORY_FILE)
-            settings_status.value = "<span style='color:green'>✅ Download history cleared!</span>"
-        else:
-            settings_status.value = "<span style='color:gray'>ℹ️ No history file to clear.</span>"
+        settings_status.value = "<span style='color:green'>✅ Download history cleared!</span>"
+    except FileNotFoundError:
+        settings_status.value = "<span style='color:gray'>ℹ️ No history file to clear.</span>"
     except Exception as e:
         settings_status.value = f"<span style='color:red'>❌ Error: {str(e)[:50]}</span>"
 
@@ -413,23 +514,21 @@ def _do_clear_ytarchive():
     """Actually clear the yt-dlp download archive."""
     archive_path = f"{UD_CONFIG_PATH}yt_history.txt"
     try:
-        if os.path.exists(archive_path):
-            os.remove(archive_path)
-            settings_status.value = "<span style='color:green'>✅ YT archive cleared! You can now re-download previous videos.</span>"
-        else:
-            settings_status.value = "<span style='color:gray'>ℹ️ No YT archive file to clear.</span>"
+        os.remove(archive_path)
+        settings_status.value = "<span style='color:green'>✅ YT archive cleared! You can now re-download previous videos.</span>"
+    except FileNotFoundError:
+        settings_status.value = "<span style='color:gray'>ℹ️ No YT archive file to clear.</span>"
     except Exception as e:
         settings_status.value = f"<span style='color:red'>❌ Error: {str(e)[:50]}</span>"
 
 def _do_clear_session():
     """Actually clear the session file."""
     try:
-        if os.path.exists(SESSION_FILE):
-            os.remove(SESSION_FILE)
-            btn_resume.layout.display = 'none'
-            settings_status.value = "<span style='color:green'>✅ Session cleared!</span>"
-        else:
-            settings_status.value = "<span style='color:gray'>ℹ️ No session file to clear.</span>"
+        os.remove(SESSION_FILE)
+        btn_resume.layout.display = 'none'
+        settings_status.value = "<span style='color:green'>✅ Session cleared!</span>"
+    except FileNotFoundError:
+        settings_status.value = "<span style='color:gray'>ℹ️ No session file to clear.</span>"
     except Exception as e:
         settings_status.value = f"<span style='color:red'>❌ Error: {str(e)[:50]}</span>"
 
@@ -444,7 +543,7 @@ def update_queue_display():
     options = []
     for i, task in enumerate(pending_queue):
         source_icon = {"gofile": "📁", "pixeldrain": "💾", "rd": "⚡", "direct": "🔗", 
-                       "youtube": "▶️", "mega": "☁️", "mediafire": "🔥", "1fichier": "📦"}.get(task.link_type, "📄")
+                       "youtube": "▶️", "mega": "☁️", "mediafire": "🔥", "1fichier": "📦", "magnet": "🧲"}.get(task.link_type, "📄")
         name = task.filename[:50] if task.filename else task.url[:50]
         options.append(f"{i+1}. {source_icon} {name}")
     queue_list.options = options
@@ -476,7 +575,7 @@ def queue_move_up(b=None):
     selected = list(queue_list.value)
     if not selected:
         return
-    indices = [int(s.split('.')[0]) - 1 for s in selected]
+    indices = [int(s.partition('.')[0]) - 1 for s in selected]
     indices.sort()
     for idx in indices:
         if idx > 0 and idx - 1 not in indices:
@@ -492,7 +591,7 @@ def queue_move_down(b=None):
     selected = list(queue_list.value)
     if not selected:
         return
-    indices = [int(s.split('.')[0]) - 1 for s in selected]
+    indices = [int(s.partition('.')[0]) - 1 for s in selected]
     indices.sort(reverse=True)
     for idx in indices:
         if idx < len(pending_queue) - 1 and idx + 1 not in indices:
@@ -516,7 +615,7 @@ def queue_remove_selected(b=None):
     selected = list(queue_list.value)
     if not selected:
         return
-    indices_to_remove = {int(s.split('.')[0]) - 1 for s in selected}
+    indices_to_remove = {int(s.partition('.')[0]) - 1 for s in selected}
     pending_queue = [t for i, t in enumerate(pending_queue) if i not in indices_to_remove]
     update_queue_display()
     if not pending_queue:
@@ -538,7 +637,7 @@ def start_from_queue(b=None):
         return
     
     # Get selected indices
-    selected_indices = {int(s.split('.')[0]) - 1 for s in selected}
+    selected_indices = {int(s.partition('.')[0]) - 1 for s in selected}
     selected_tasks = [t for i, t in enumerate(pending_queue) if i in selected_indices]
     
     if not selected_tasks:
@@ -571,81 +670,102 @@ def normalize_playlist_range(range_str):
         return None
     return range_str.replace(' ', '')
 
+@lru_cache(maxsize=256)
+def url_basename(url: str) -> str:
+    """Last path segment of a URL, percent-decoded. The only place a name gets unquoted."""
+    return os.path.basename(unquote(urlparse(url).path))
+
+@lru_cache(maxsize=2048)
 def sanitize_filename(name: str) -> str:
-    name = unquote(name)
-    name = re.sub(r'[<>:"/\\|?*]', '_', name) 
-    name = re.sub(r'[\s_]+', ' ', name).strip()
-    return name
+    """Map reserved chars to spaces, drop control chars and collapse whitespace. Idempotent, so routing can re-run it."""
+    return ' '.join(name.translate(_FILENAME_TRANS).split())
 
+@lru_cache(maxsize=1024)
 def clean_show_name(name: str) -> str:
-    # Remove common YouTube prefixes (VIETSUB, ENGSUB, THUYẾT MINH, etc.)
-    name = re.sub(r'(?i)^\s*(?:VIETSUB|VietSub|ENGSUB|EngSub|ENG\s*SUB|VIET\s*SUB|THUYẾT\s*MINH|RAW|FULL|HD)\s*[|｜:：\-–—]\s*', '', name)
-    # Remove technical tags in brackets or standalone
-    name = re.sub(r'(?i)(?:\[?\s*(?:ENG\s*SUB|ENGSUB|FULL|WEB-?DL|WEBRip|BluRay|HDR|10bit|Atmos|DV|Vision|DDP\d\.\d|x265|HEVC|x264|H\.\d{3})\s*\]?)', '', name)
-    name = re.sub(r'(?i)\b(2160p|1080p|720p|480p|4k|8k)\b', '', name)
-    name = re.sub(r'[\[\]\(\)《》「」【】]', ' ', name)
+    """Strip tags/separators from a show or movie title. Memoized: every episode of a show shares the same prefix."""
+    # Remove common YouTube prefixes (VIETSUB, ENGSUB, THUYẾT MINH, etc.) and technical tags in brackets or standalone
+    name = _RE_SHOW_TAGS.sub('', name)
+    name = _RE_SHOW_RESOLUTION.sub('', name)
+    name = name.translate(_SHOW_BRACKETS_TRANS)
     # Remove trailing pipe/separator sections (e.g., "Show Name | Episode Info |" -> "Show Name")
-    name = re.sub(r'\s*[|｜]\s*$', '', name)
-    name = re.sub(r'[|｜._-]', ' ', name)
-    name = re.sub(r'(?i)\s+\b(END|FINALE|FINAL)\b$', '', name)
-    clean = re.sub(r'\s+', ' ', name).strip()
+    if '|' in name or '｜' in name: name = _RE_SHOW_TRAILING_PIPE.sub('', name)
+    name = name.translate(_SHOW_SEPARATORS_TRANS)
+    name = _RE_SHOW_END_MARKER.sub('', name)
+    clean = ' '.join(name.split())
     return clean if clean else "Unknown Show"
 
-def is_safe_path(base_dir: str, filename: str) -> bool:
-    """Prevent directory traversal attacks with strict prefix checking"""
+def ensure_dir(path: str):
+    """Create a directory once per session; later calls skip the Drive metadata lookup."""
+    if path in known_dirs: return
+    parent = os.path.dirname(path)
+    if parent in known_dirs:
+        # New season of a known show etc.: one mkdir instead of makedirs probing each ancestor on FUSE
+        try: os.mkdir(path)
+        except FileExistsError: pass
+    else:
+        os.makedirs(path, exist_ok=True)
+        known_dirs.add(parent)
+    known_dirs.add(path)
+
+def move_file(src: str, dst: str):
+    """Move a file, using replace() on the same filesystem and an in-kernel sendfile copy across filesystems (local disk -> Drive).
+    An existing dst is overwritten either way. A directory crossing filesystems is handed to shutil.move."""
     try:
-        target_path = os.path.realpath(os.path.join(base_dir, filename))
-        base_path = os.path.realpath(base_dir)
-        return target_path.startswith(base_path + os.sep) or target_path == base_path
-    except Exception:
-        return False
+        os.replace(src, dst)  # One atomic rename(2) that also drops an existing dst, on every platform
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV: raise
+    if os.path.isdir(src):
+        shutil.move(src, dst)  # Recursive copy + delete; sendfile only handles regular files
+        return
+    chunk = 4 * 1024 * 1024
+    with open(src, 'rb') as fi, open(dst, 'wb') as fo:
+        try:
+            os.posix_fadvise(fi.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            # Ask for the whole file per call (capped at 1 GiB) - the kernel splits it, we just loop on short sends
+            blocksize = min(max(os.fstat(fi.fileno()).st_size, chunk), 1 << 30)
+            offset = 0
+            while True:
+                sent = os.sendfile(fo.fileno(), fi.fileno(), offset, blocksize)
+                if sent == 0: break
+                offset += sent
+        except (AttributeError, OSError):
+            # No sendfile support for this pair of files - fall back to a userspace copy
+            fi.seek(0); fo.seek(0); fo.truncate()
+            shutil.copyfileobj(fi, fo, chunk)
+    os.remove(src)
 
 def check_duplicate_in_drive(filename: str, source: str = "generic", playlist_index: Optional[int] = None) -> bool:
     """Check if file already exists in Drive to avoid re-downloading"""
     dest_path, category = determine_destination_path(filename, source, dry_run=True, playlist_index=playlist_index)
-    if os.path.exists(dest_path):
-        file_size = os.path.getsize(dest_path) / (1024 * 1024)
-        print(f"   ⏭️  SKIPPED (Already exists): {os.path.basename(dest_path)} ({file_size:.1f} MB)")
-        return True
-    return False
+    try:
+        file_size = os.stat(dest_path).st_size / (1024 * 1024)  # One stat instead of exists + getsize
+    except FileNotFoundError:
+        return False
+    print(f"   ⏭️  SKIPPED (Already exists): {os.path.basename(dest_path)} ({file_size:.1f} MB)")
+    return True
 
-def determine_destination_path(filename: str, source: str = "generic", dry_run: bool = False, playlist_index: Optional[int] = None) -> Tuple[str, str]:
-    filename = sanitize_filename(filename)
-    part_suffix = ""
-    if "上篇" in filename or re.search(r'(?i)(?:Part|Pt)\.?\s*1\b', filename): part_suffix = "-pt1"
-    elif "下篇" in filename or re.search(r'(?i)(?:Part|Pt)\.?\s*2\b', filename): part_suffix = "-pt2"
-    elif "中篇" in filename: part_suffix = "-pt2"
+@lru_cache(maxsize=1024)
+def _plan_destination(filename: str, source: str, manual_show_name: str, playlist_index: Optional[int]) -> Tuple[str, str, str]:
+    """Parse a sanitized filename into (directory, filename, category). Pure, so results are memoized."""
+    # Any part-1 marker wins over part-2 markers, wherever they appear
+    part_marks = {m.group(1) or m.group(2) for m in _RE_PART.finditer(filename)}
+    part_suffix = ("-pt1" if part_marks & _PART_ONE else "-pt2") if part_marks else ""
 
-    manual_show_name = show_name_override.value.strip()
     show_name = "Unknown Show" 
     
-    sxe_strict = re.search(r'(?i)\bS(\d{1,2})E(\d{1,2})\b', filename)
-    # Added Vietnamese "Tập", Korean "화", and more flexible episode patterns
-    sxe_loose = re.search(r'(?i)(?:\b(?:Ep?|Episode|Tập|Tập phim|Folge|Capitulo|Cap)[ .\-_]?(\d{1,3})\b|[|\-–—]\s*(?:Ep?|Episode|Tập)?\s*(\d{1,3})\s*[|\]]?)', filename)
-    sxe_asian = re.search(r'(?:第(\d+)集|(\d+)화)', filename)
-
     season_num, episode_num = 1, 1
     is_tv = False
     episode_detected = False
 
-    # Collect all valid matches and find the earliest one to split correctly
-    matches = []
-    if sxe_strict: matches.append({'m': sxe_strict, 'type': 'strict', 'idx': sxe_strict.start()})
-    if sxe_loose: matches.append({'m': sxe_loose, 'type': 'loose', 'idx': sxe_loose.start()})
-    if sxe_asian: matches.append({'m': sxe_asian, 'type': 'asian', 'idx': sxe_asian.start()})
-    
-    if matches:
-        # Sort by start index to find the FIRST occurrence (splitting show name from episode info)
-        best = min(matches, key=lambda x: x['idx'])
-        match, m_type = best['m'], best['type']
-        
+    # One scan finds the FIRST episode marker (splitting show name from episode info)
+    match = _RE_EPISODE.search(filename)
+    if match:
+        m_type = match.lastgroup
         if m_type == 'strict':
-            season_num, episode_num = int(match.group(1)), int(match.group(2))
-        elif m_type == 'loose':
-            ep_num = match.group(1) or match.group(2)
-            episode_num = int(ep_num) if ep_num else 1
-        elif m_type == 'asian':
-            ep_num = match.group(1) or match.group(2)
+            season_num, episode_num = int(match['s_season']), int(match['s_episode'])
+        else:
+            ep_num = (match['l_ep1'] or match['l_ep2']) if m_type == 'loose' else (match['a_ep1'] or match['a_ep2'])
             episode_num = int(ep_num) if ep_num else 1
             
         show_name = clean_show_name(filename[:match.start()])
@@ -665,24 +785,68 @@ def determine_destination_path(filename: str, source: str = "generic", dry_run:
             episode_num = playlist_index
     elif is_tv: pass
     else:
-        year_match = re.search(r'\b(19|20)\d{2}\b', filename)
+        year_match = _RE_YEAR.search(filename)
         if year_match: movie_name = clean_show_name(filename[:year_match.start()])
         elif source == "youtube":
-            return os.path.join(f"{DRIVE_BASE}{DRIVE_YOUTUBE_PATH}", filename), "YouTube"
+            return DRIVE_YOUTUBE_DIR, filename, "YouTube"
         else: movie_name = clean_show_name(os.path.splitext(filename)[0])
-        full_dir = os.path.join(f"{DRIVE_BASE}{DRIVE_MOVIE_PATH}", movie_name)
-        if not dry_run and not os.path.exists(full_dir): os.makedirs(full_dir, exist_ok=True)
-        return os.path.join(full_dir, filename), "Movies"
+        return f"{DRIVE_MOVIE_DIR}/{movie_name}", filename, "Movies"
 
-    base_path = f"{DRIVE_BASE}{DRIVE_TV_PATH}"
-    season_folder = f"Season {season_num:02d}"
-    full_dir = os.path.join(base_path, show_name, season_folder)
+    full_dir = f"{DRIVE_TV_DIR}/{show_name}/Season {season_num:02d}"
     _, ext = os.path.splitext(filename)
     new_filename = f"{show_name} - S{season_num:02d}E{episode_num:02d}{part_suffix}{ext}"
-    if not dry_run and not os.path.exists(full_dir): os.makedirs(full_dir, exist_ok=True)
-    return os.path.join(full_dir, new_filename), "TV"
+    return full_dir, new_filename, "TV"
+
+def split_destination_path(filename: str, source: str = "generic", dry_run: bool = False, playlist_index: Optional[int] = None) -> Tuple[str, str, str]:
+    """Like determine_destination_path, but returns (directory, filename, category) so callers don't re-split the path."""
+    full_dir, dest_name, category = _plan_destination(sanitize_filename(filename), source, show_name_override.value.strip(), playlist_index)
+    if not dry_run: ensure_dir(full_dir)
+    return full_dir, dest_name, category
+
+def determine_destination_path(filename: str, source: str = "generic", dry_run: bool = False, playlist_index: Optional[int] = None) -> Tuple[str, str]:
+    full_dir, dest_name, category = split_destination_path(filename, source, dry_run, playlist_index)
+    return os.path.join(full_dir, dest_name), category
 
 # --- CORE LOGIC ---
+# apt package -> binary it provides (used to skip packages already on PATH)
+APT_PACKAGE_BINARIES = {
+    "unrar": "unrar", 
+    "p7zip-full": "7z", 
+    "megatools": "megadl", 
+    "aria2": "aria2c", 
+    "ffmpeg": "ffmpeg"
+}
+tools_lock = Lock()  # Parallel workers may hit their first archive at the same time
+archive_tools_ready = False
+tools_on_path: Set[str] = set()  # Binaries already found; misses aren't cached since we may install them
+
+def has_tool(binary: str) -> bool:
+    """shutil.which, but each Start press doesn't re-walk $PATH for tools already found."""
+    if binary in tools_on_path: return True
+    if not shutil.which(binary): return False
+    tools_on_path.add(binary)
+    return True
+
+def install_packages(packages: List[str]) -> List[str]:
+    """apt-get install any of the given packages whose binary is missing. Returns the packages installed."""
+    to_install = [pkg for pkg in packages if not has_tool(APT_PACKAGE_BINARIES[pkg])]
+    if to_install:
+        print(f"🛠️ Installing tools: {', '.join(to_install)}...")
+        apt_install = ["apt-get", "install", "-y", "--no-install-recommends", "-o", "Dpkg::Use-Pty=0"] + to_install
+        # Colab usually ships a usable package index; only pay for `apt-get update` if the install fails
+        if subprocess.run(apt_install, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode != 0:
+            subprocess.run(["apt-get", "update", "-qq"], stdin=subprocess.DEVNULL, check=False)
+            subprocess.run(apt_install, check=True, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+    return to_install
+
+def ensure_archive_tools():
+    """Install unrar/7z the first time an archive actually needs extracting."""
+    global archive_tools_ready
+    with tools_lock:
+        if archive_tools_ready: return
+        install_packages(["unrar", "p7zip-full"])
+        archive_tools_ready = True
+
 def setup_environment(needs_mega, needs_ytdlp, needs_aria):
     drive_path = f"{COLAB_ROOT}drive"
     if not os.path.exists(drive_path): drive.mount(drive_path)
@@ -691,40 +855,24 @@ def setup_environment(needs_mega, needs_ytdlp, needs_aria):
     check_and_load_secrets()
     
     # Create media folders and config folder
-    for p in [DRIVE_TV_PATH, DRIVE_MOVIE_PATH, DRIVE_YOUTUBE_PATH]:
-        full_p = f"{DRIVE_BASE}{p}"
-        if not os.path.exists(full_p): os.makedirs(full_p)
-    if not os.path.exists(UD_CONFIG_PATH): os.makedirs(UD_CONFIG_PATH)
+    for full_p in [DRIVE_TV_DIR, DRIVE_MOVIE_DIR, DRIVE_YOUTUBE_DIR]:
+        ensure_dir(full_p)
+    ensure_dir(UD_CONFIG_PATH)
     
     if needs_ytdlp:
         try: import yt_dlp
         except ImportError:
             print("🛠️ Installing yt-dlp...")
-            subprocess.run(["pip", "install", "yt-dlp"], check=True, stdout=subprocess.DEVNULL)
+            subprocess.run([sys.executable, "-m", "pip", "install", "-q", "yt-dlp"], check=True, stdout=subprocess.DEVNULL)
     else:
         print("⭐️ Skipping yt-dlp (Not needed)")
 
-    pkg_map = {
-        "unrar": "unrar", 
-        "p7zip-full": "7z", 
-        "megatools": "megadl", 
-        "aria2": "aria2c", 
-        "ffmpeg": "ffmpeg"
-    }
-    
-    needed_pkgs = ["unrar", "p7zip-full"]
+    needed_pkgs = []
     if needs_mega: needed_pkgs.append("megatools")
     if needs_aria: needed_pkgs.append("aria2")
     if needs_ytdlp: needed_pkgs.append("ffmpeg")
     
-    to_install = [pkg for pkg in needed_pkgs if not shutil.which(pkg_map[pkg])]
-
-    if to_install:
-        print(f"🛠️ Installing tools: {', '.join(to_install)}...")
-        subprocess.run(["apt-get", "update", "-qq"], check=False)
-        subprocess.run(["apt-get", "install", "-y"] + to_install, 
-                       check=True, stdout=subprocess.DEVNULL)
-    else:
+    if not install_packages(needed_pkgs):
         print("✅ Required tools already present.")
     
     check_resume_available()
@@ -743,6 +891,13 @@ def ytdl_hook(d):
             progress_bar.value = 100
             progress_bar.description = "Done!"
 
+def ytdl_output_files(info: Dict[str, Any], media: bool = True) -> List[str]:
+    """Final paths yt-dlp wrote for one video (merged media + subtitles), read from its info dict."""
+    # With skip_download, yt-dlp still fills requested_downloads with the media path it never wrote
+    paths = [d.get('filepath') for d in info.get('requested_downloads') or []] if media else []
+    paths += [sub.get('filepath') for sub in (info.get('requested_subtitles') or {}).values()]
+    return [p for p in paths if p]
+
 def process_youtube_link(url, mode="video") -> Tuple[int, int, int]:
     """Process YouTube link. Returns (success_count, fail_count, total_count)."""
     import yt_dlp
@@ -770,6 +925,7 @@ def process_youtube_link(url, mode="video") -> Tuple[int, int, int]:
         'progress_hooks': [ytdl_hook], 
         'noprogress': True,
         'download_archive': archive_path,
+        'concurrent_fragment_downloads': YTDLP_CONCURRENT_FRAGMENTS,  # Native downloader, so progress hooks keep working
     }
     
     if playlist_items:
@@ -839,17 +995,16 @@ def process_youtube_link(url, mode="video") -> Tuple[int, int, int]:
                 print(f"      [{i}/{total_items}] Downloading: {title}")
                 
                 try:
-                    before = set(os.listdir(COLAB_ROOT))
-                    ydl.download([entry.get('webpage_url', entry.get('url'))])
-                    after = set(os.listdir(COLAB_ROOT))
-                    new_files = list(after - before)
+                    # yt-dlp reports where it put each file - no before/after listing of COLAB_ROOT,
+                    # which would also pick up files other workers are writing there
+                    result = ydl.extract_info(entry.get('webpage_url', entry.get('url')), download=True)
+                    new_files = ytdl_output_files(result, media=mode == "video") if result else []
                     
                     if not new_files:
                         fail_count += 1
                         continue
                     for f in new_files:
-                        if f.endswith(('.part', '.ytdl')): continue
-                        handle_file_processing(os.path.join(COLAB_ROOT, f), source="youtube")
+                        handle_file_processing(f, source="youtube")
                     success_count += 1
                 except Exception as e:
                     print(f"      ❌ Failed to download {title}: {str(e)[:80]}")
@@ -874,9 +1029,15 @@ def process_mega_link(url):
     try:
         process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1, universal_newlines=True)
         last_speed = ""
+        last_update = 0.0
         for line in process.stdout:
-            match = re.search(r'(\d+\.\d+)%', line)
-            speed_match = re.search(r'(\d+\.?\d*\s*[KMG]B/s)', line)
+            # Consume every line as it streams in, but only parse/redraw at the monitor's refresh rate
+            if '%' not in line: continue
+            now = time.monotonic()
+            if now - last_update < PROGRESS_INTERVAL: continue
+            last_update = now
+            match = _RE_MEGA_PERCENT.search(line)
+            speed_match = _RE_MEGA_SPEED.search(line)
             if match:
                 try:
                     val = float(match.group(1))
@@ -891,9 +1052,19 @@ def process_mega_link(url):
             print("   ✅ Mega Download Complete")
             with progress_lock:
                 progress_bar.value = 100
-            for f in os.listdir(COLAB_ROOT):
-                if f not in ['sample_data', '.config', 'drive', 'temp_extract', 'cookies.txt']: 
-                    handle_file_processing(os.path.join(COLAB_ROOT, f), source="mega")
+            # scandir's d_type tells files from folders without a stat per entry
+            with os.scandir(COLAB_ROOT) as it:
+                found = [e for e in it if e.name not in MEGA_SWEEP_SKIP]
+            for e in found:
+                if not e.is_dir():
+                    handle_file_processing(e.path, source="mega")
+                    continue
+                # Folder links arrive as a tree: route each file in it like a single-file download
+                for f in list(iter_extracted_files(e.path)):
+                    handle_file_processing(f.path, source="mega")
+                for dirpath, _, _ in os.walk(e.path, topdown=False):
+                    try: os.rmdir(dirpath)  # Only emptied folders go; anything left behind stays visible
+                    except OSError: pass
         else: 
             print(f"   ❌ Mega Error (Code {process.returncode}) - Possible causes: Invalid link, auth required, or file not found")
     except Exception as e: 
@@ -901,33 +1072,87 @@ def process_mega_link(url):
     with progress_lock:
         progress_bar.bar_style = 'info'
 
-def download_with_aria2(url: str, filename: str, dest_folder: str, cookie: Optional[str] = None, task_id: Optional[str] = None) -> Optional[str]:
-    """Thread-safe aria2 download with progress tracking."""
-    filename = sanitize_filename(filename)
+ARIA2_ARGS = ['-k', '10M',  # No 1 MB segments: small files don't pay 16 connection setups
+              '-c', '--file-allocation=none', '--user-agent', 'Mozilla/5.0', 
+              '--connect-timeout=30', '--timeout=60', '--max-tries=5', '--retry-wait=5', '--console-log-level=warn',
+              '--summary-interval=0', '--download-result=hide',  # Only progress readouts reach stdout
+              '--disk-cache=64M', '--optimize-concurrent-downloads=true',
+              '--auto-file-renaming=false',  # Resume into the named file instead of writing "name.1.mkv"
+              '--max-file-not-found=2']  # Dead links fail fast instead of spending every retry on a 404
+
+def aria2_connection_args(parallel: int = 1) -> List[str]:
+    """-x/-s for each of `parallel` downloads running at once: share the connection budget, min 4 each."""
+    n = str(max(4, ARIA2_MAX_CONNECTIONS // max(parallel, 1)))
+    return ['-x', n, '-s', n]
+
+def download_batch_with_aria2(items: List[Tuple[str, str]], dest_folder: str) -> List[str]:
+    """Download several (url, filename) pairs in a single aria2 process via an input file. Returns completed paths."""
+    pending = []
+    for url, filename in items:
+        filename = sanitize_filename(filename)
+        if not check_duplicate_in_drive(filename): pending.append((url, filename))
+    if not pending: return []
+    
+    print(f"   ⬇️ Downloading {len(pending)} files in one aria2 batch...")
+    input_path = os.path.join(dest_folder, f".aria2_batch_{uuid4().hex[:8]}.txt")
+    try:
+        with open(input_path, 'w') as f:
+            for url, filename in pending:
+                f.write(f"{url}\n  dir={dest_folder}\n  out={filename}\n")
+        running = min(concurrent_slider.value, len(pending))  # Only split connections across downloads that exist
+        cmd = ['aria2c', '-i', input_path, '-j', str(running)] + aria2_connection_args(running) + ARIA2_ARGS
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except Exception as e:
+        print(f"   ❌ Batch download error: {str(e)[:80]}")
+    finally:
+        try: os.remove(input_path)
+        except FileNotFoundError: pass
+    
+    completed = []
+    for _, filename in pending:
+        path = os.path.join(dest_folder, filename)
+        # aria2 leaves a .aria2 control file next to anything it did not finish
+        if os.path.exists(path) and not os.path.exists(f"{path}.aria2"): completed.append(path)
+        else: print(f"   ❌ Download failed: {filename}")
+    return completed
+
+def download_with_aria2(url: str, filename: str, dest_folder: str, cookie: Optional[str] = None, task_id: Optional[str] = None, parallel: int = 1) -> Optional[str]:
+    """Thread-safe aria2 download with progress tracking. `parallel` is how many downloads share the connection budget."""
+    filename = sanitize_filename(filename) or "download"  # A name made only of reserved chars would leave nothing
     
     if check_duplicate_in_drive(filename):
         return None
     
     final_path = os.path.join(dest_folder, filename)
-    if os.path.exists(final_path) and os.path.getsize(final_path) > 1024*1024: return final_path
+    try:
+        # A leftover .aria2 control file means an earlier attempt didn't finish - resume it instead
+        if os.stat(final_path).st_size > 1024*1024 and not os.path.exists(f"{final_path}.aria2"): return final_path
+    except FileNotFoundError:
+        pass
     print(f"   ⬇️ Downloading: {filename}")
     
     with progress_lock:
         if task_id:
             active_downloads[task_id] = "starting"
     
-    cmd = ['aria2c', url, '-d', dest_folder, '-o', filename, '-x', '16', '-s', '16', '-k', '1M', 
-           '-c', '--file-allocation=none', '--user-agent', 'Mozilla/5.0', 
-           '--connect-timeout=30', '--timeout=60', '--max-tries=3', '--retry-wait=2', '--console-log-level=warn']
+    cmd = ['aria2c', url, '-d', dest_folder, '-o', filename] + aria2_connection_args(parallel) + ARIA2_ARGS
     if cookie: cmd.extend(['--header', f'Cookie: accountToken={cookie}'])
     
     for attempt in range(1, 4):
         try:
-            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1, universal_newlines=True)
+            # Without a task_id nothing displays the readouts, so let aria2 write them to /dev/null
+            out = subprocess.PIPE if task_id else subprocess.DEVNULL
+            process = subprocess.Popen(cmd, stdout=out, stderr=subprocess.STDOUT, text=True, bufsize=1, universal_newlines=True)
             last_speed = ""
-            for line in process.stdout:
-                match = re.search(r'\((\d+)%\)', line)
-                speed_match = re.search(r'DL:(\d+\.?\d*[KMG]iB/s)', line)
+            last_update = 0.0
+            for line in (iter(process.stdout.readline, '') if task_id else ()):
+                if '%)' not in line: continue  # Not a progress readout
+                # The monitor only redraws every PROGRESS_INTERVAL, so don't parse readouts faster than that
+                now = time.monotonic()
+                if now - last_update < PROGRESS_INTERVAL: continue
+                last_update = now
+                match = _RE_ARIA2_PERCENT.search(line)
+                speed_match = _RE_ARIA2_SPEED.search(line)
                 if match:
                     try: 
                         val = float(match.group(1))
@@ -956,102 +1181,235 @@ def download_with_aria2(url: str, filename: str, dest_folder: str, cookie: Optio
             active_downloads[task_id] = "failed"
     return None
 
+def iter_extracted_files(root: str):
+    """Yield DirEntry objects for every non-directory under root, skipping __MACOSX folders."""
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name != '__MACOSX': stack.append(entry.path)
+                else:
+                    yield entry
+
+def is_safe_path(member: str) -> bool:
+    """True if an archive member name stays inside the extraction folder (no absolute path or '..' escape)."""
+    p = os.path.normpath(member)
+    return not (os.path.isabs(p) or p == os.pardir or p.startswith(os.pardir + os.sep))
+
+def list_archive(file_path: str, archive_tool: str) -> Optional[List[Tuple[str, int, bool]]]:
+    """(member path, unpacked size, is regular file) for every non-folder entry, from one listing call. None if unreadable."""
+    if archive_tool == 'unrar': cmd, name_key, sep = ['unrar', 'lt', file_path], 'Name', ': '
+    else: cmd, name_key, sep = ['7z', 'l', '-ba', '-slt', file_path], 'Path', ' = '
+    members: List[Tuple[str, int, bool]] = []
+    record: Dict[str, str] = {}
+    def flush():
+        if not record: return
+        kind = record.get('Type', 'File')  # unrar: File / Directory / Symbolic link...
+        attrs = record.get('Attributes', '').split()  # 7z: "A_ -rw-r--r--", a unix mode of "l..." is a symlink
+        if record.get('Folder') == '+' or kind == 'Directory' or record.get('Attributes', '').startswith('D'): return
+        regular = kind == 'File' and not (len(attrs) > 1 and attrs[-1].startswith('l'))
+        try: size = int(record.get('Size', 0))
+        except ValueError: size = 0
+        members.append((record[name_key], size, regular))
+    try:
+        # Parse lines as the tool prints them instead of buffering the whole listing first
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, errors='replace') as proc:
+            for line in proc.stdout:
+                key, found, value = line.strip().partition(sep)
+                if not found: continue
+                if key == name_key:
+                    flush()
+                    record = {}
+                elif not record: continue  # unrar's "Archive:"/"Details:" header comes before the first member
+                record[key] = value
+    except Exception: return None
+    if proc.returncode != 0: return None
+    flush()
+    return members
+
 def handle_file_processing(file_path, source="generic"):
-    if not file_path or not os.path.exists(file_path): return
+    if not file_path: return
+    try: file_size = os.stat(file_path).st_size  # One stat covers the existence check and the history size
+    except FileNotFoundError: return
     filename = os.path.basename(file_path)
     _, ext = os.path.splitext(filename)
+    archive_tool = ARCHIVE_TOOLS.get(ext.lower())
 
-    if ext not in ['.rar', '.zip', '.7z']:
-        processing_name = filename
+    if archive_tool is None:
+        processing_name, lang = filename, ""
         if ext == '.srt':
-            parts = filename.split('.')
-            if len(parts) >= 3 and len(parts[-2]) in [2, 3]: processing_name = ".".join(parts[:-2]) + ext
+            # "Show.S01E02.en.srt": route as "Show.S01E02.srt", then put the language tag back
+            stem, dot, tag = filename[:-len(ext)].rpartition('.')
+            if dot and len(tag) in (2, 3): processing_name, lang = stem + ext, tag
         
-        final_dest, cat = determine_destination_path(processing_name, source)
+        dest_dir, dest_name, cat = split_destination_path(processing_name, source)
         
         if ext == '.srt':
-            parts = filename.split('.')
-            lang = parts[-2] if len(parts) >= 3 and len(parts[-2]) in [2, 3] else ""
-            base = os.path.splitext(final_dest)[0]
-            final_dest = f"{base}.{lang}.srt" if lang else f"{base}.srt"
-        if os.path.exists(final_dest): os.remove(final_dest)
+            base = os.path.splitext(dest_name)[0]
+            dest_name = f"{base}.{lang}.srt" if lang else f"{base}.srt"
+        final_dest = os.path.join(dest_dir, dest_name)
+        # No unlink first: rename() replaces atomically and the cross-device copy truncates
         
-        if not os.path.exists(os.path.dirname(final_dest)): os.makedirs(os.path.dirname(final_dest))
-        size_mb = os.path.getsize(file_path) / (1024 * 1024)
-        shutil.move(file_path, final_dest)
-        print(f"   ✨ Moved to {cat}: {os.path.basename(final_dest)}")
-        log_download(os.path.basename(final_dest), source, size_mb, final_dest)
+        size_mb = file_size / (1024 * 1024)
+        move_file(file_path, final_dest)
+        print(f"   ✨ Moved to {cat}: {dest_name}")
+        log_download(dest_name, source, size_mb, final_dest)
         return
 
     print(f"   📦 Archive Detected: {filename}")
-    extract_temp = f"{COLAB_ROOT}temp_extract"
-    if os.path.exists(extract_temp): shutil.rmtree(extract_temp)
-    os.makedirs(extract_temp)
-
-    archive_files = []
-    try:
-        if '.rar' in ext:
-            res = subprocess.run(['unrar', 'lb', file_path], capture_output=True, text=True)
-            if res.returncode == 0: archive_files = res.stdout.strip().splitlines()
-        else:
-            res = subprocess.run(['7z', 'l', '-ba', '-slt', file_path], capture_output=True, text=True)
-            if res.returncode == 0:
-                for line in res.stdout.splitlines():
-                    if line.strip().startswith('Path = '): archive_files.append(line.split(' = ')[1])
-    except Exception as e:
-        print(f"   ❌ Failed to read archive: {str(e)[:80]}")
+    ensure_archive_tools()
+    # One listing call up front: unsafe names are rejected before anything is written, and the
+    # unpacked size decides whether the whole archive fits on disk next to itself
+    members = list_archive(file_path, archive_tool)
+    if members is None:
+        print(f"   ❌ Failed to read archive - File may be corrupt or password protected")
         return
-    
-    total_files = len(archive_files)
-    print(f"   📄 Extracting {total_files} files sequentially...")
-    extracted_count = 0
-    
-    for f_path in archive_files:
-        if f_path.endswith(('/', '\\')) or '__MACOSX' in f_path: continue
-        
-        if not is_safe_path(extract_temp, f_path):
-            print(f"      ⚠️ SKIPPING UNSAFE PATH: {f_path}")
+    wanted: List[Tuple[str, int]] = []
+    contained = True
+    for name, size, regular in members:
+        if '__MACOSX' in name.replace('\\', '/').split('/'): continue
+        if not regular or not is_safe_path(name):
+            print(f"      ⚠️ SKIPPING UNSAFE PATH: {name}")
+            contained = False
             continue
+        wanted.append((name, size))
 
-        extracted_count += 1
-        with progress_lock:
-            progress_bar.description = f"Extract: {extracted_count}/{total_files}"
-            progress_bar.value = (extracted_count / total_files) * 100
-        
-        cmd = []
-        if '.rar' in ext: cmd = ['unrar', 'x', '-o+', file_path, f_path, extract_temp]
-        else: cmd = ['7z', 'x', '-y', file_path, f'-o{extract_temp}', f_path]
-        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        
-        extracted_full = os.path.join(extract_temp, f_path)
-        if os.path.exists(extracted_full) and not os.path.isdir(extracted_full):
-            if os.path.getsize(extracted_full) < MIN_FILE_SIZE_MB * 1024 * 1024 and not f_path.endswith(tuple(KEEP_EXTENSIONS)):
-                os.remove(extracted_full); continue
-            final_dest, cat = determine_destination_path(f_path, source)
+    # Each archive gets its own folder - parallel workers may be extracting too
+    extract_temp = os.path.join(EXTRACT_ROOT, uuid4().hex[:8])
+    ensure_dir(EXTRACT_ROOT)
+    os.mkdir(extract_temp)  # Fresh uuid name under a known parent: one mkdir, no ancestor probing
+    with progress_lock:
+        progress_bar.description = "Extracting..."
+        progress_bar.value = 0
+    
+    extracted_count = 0
+    min_bytes, keep_exts = MIN_FILE_SIZE_MB * 1024 * 1024, tuple(KEEP_EXTENSIONS)
+    claimed: Set[str] = set()
+    drive_names: Dict[str, Set[str]] = {}  # Destination dir -> names already there: one listdir per dir, not a stat per file
+
+    def plan(entries) -> List[Tuple[str, str, float]]:
+        """Filter extracted files and pick each one's Drive destination: (extracted file, destination, size in MB)."""
+        nonlocal extracted_count
+        moves = []
+        for entry in entries:
+            extracted_full = entry.path
+            f_path = extracted_full[len(extract_temp) + 1:]  # Path inside the archive
             
-            if os.path.exists(final_dest):
-                print(f"      -> ⚠️ Duplicate in Drive (Deleted): {os.path.basename(final_dest)}")
+            # Backstop for links the listing didn't flag: the walk never follows symlinks,
+            # so skipping them here keeps every path inside extract_temp
+            if entry.is_symlink():
+                print(f"      ⚠️ SKIPPING UNSAFE PATH: {f_path}")
                 os.remove(extracted_full)
                 continue
 
-            if not os.path.exists(os.path.dirname(final_dest)): os.makedirs(os.path.dirname(final_dest))
-            size_mb = os.path.getsize(extracted_full) / (1024 * 1024)
-            shutil.move(extracted_full, final_dest)
-            print(f"      [{extracted_count}/{total_files}] -> {os.path.basename(final_dest)}")
-            log_download(os.path.basename(final_dest), source, size_mb, final_dest)
+            extracted_count += 1
+            file_size = entry.stat(follow_symlinks=False).st_size
+            if file_size < min_bytes and not f_path.endswith(keep_exts):
+                os.remove(extracted_full); continue
+            dest_dir, dest_name, cat = split_destination_path(f_path, source)
+            final_dest = os.path.join(dest_dir, dest_name)
+            if final_dest in claimed:
+                print(f"      -> ⚠️ Duplicate in archive (Deleted): {dest_name}")
+                os.remove(extracted_full)
+                continue
+            claimed.add(final_dest)
+            names = drive_names.get(dest_dir)
+            if names is None: names = drive_names[dest_dir] = set(os.listdir(dest_dir))
+            if dest_name in names:
+                print(f"      -> ⚠️ Duplicate in Drive (Deleted): {dest_name}")
+                os.remove(extracted_full)
+                continue
+            moves.append((extracted_full, final_dest, file_size / (1024 * 1024)))
+        return moves
+
+    placed, progress_total = 0, max(len(wanted), 1)
+    def place(job: Tuple[str, str, float]):
+        nonlocal placed
+        src, final_dest, size_mb = job
+        dest_name = os.path.basename(final_dest)
+        move_file(src, final_dest)
+        with progress_lock:
+            placed += 1
+            progress_bar.description = f"Extract: {placed}/{progress_total}"
+            progress_bar.value = min(placed / progress_total * 100, 100)
+            print(f"      [{placed}/{progress_total}] -> {dest_name}")
+        log_download(dest_name, source, size_mb, final_dest)
+
+    failed_runs = 0  # Extractor invocations that exited nonzero
+    unpacked = sum(size for _, size in wanted)
+    if contained and unpacked < shutil.disk_usage(EXTRACT_ROOT).free:
+        print(f"   📄 Extracting archive in one pass...")
+        # One invocation for the whole archive instead of re-opening it per member
+        if archive_tool == 'unrar': cmd = ['unrar', 'x', '-o+', '-inul', file_path, extract_temp + os.sep]
+        # -bso0/-bsp0: no per-file log or progress output for 7z to format - it goes to /dev/null anyway
+        else: cmd = ['7z', 'x', '-y', '-bso0', '-bsp0', '-xr!__MACOSX', file_path, f'-o{extract_temp}']  # Don't even write macOS resource forks
+        try:
+            res = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except Exception as e:
+            print(f"   ❌ Failed to extract archive: {str(e)[:80]}")
+            shutil.rmtree(extract_temp, ignore_errors=True)
+            return
         
-        if os.path.exists(extract_temp): shutil.rmtree(extract_temp, ignore_errors=True)
-        os.makedirs(extract_temp)
+        # Enumerate what actually landed on disk
+        extracted_entries = list(iter_extracted_files(extract_temp))
+        total_files = len(extracted_entries)
+        if res.returncode != 0:
+            if not total_files:
+                print(f"   ❌ Failed to read archive (exit code {res.returncode}) - File may be corrupt or password protected")
+                shutil.rmtree(extract_temp, ignore_errors=True)
+                return
+            # Which files came out truncated can't be told apart, so none of them go to Drive (a short copy
+            # there would be taken as a duplicate on retry); the archive is kept below
+            failed_runs += 1
+            print(f"   ⚠️ Extractor reported errors (exit code {res.returncode}) - not moving the {total_files} extracted files")
+            extracted_entries = []
+        
+        moves = plan(extracted_entries)
+        progress_total = max(len(moves), 1)
+        # Each Drive upload is a chain of FUSE round-trips, so keep a few in flight instead of one at a time
+        with ThreadPoolExecutor(max_workers=DRIVE_MOVE_WORKERS) as executor:
+            list(executor.map(place, moves))
+    else:
+        # Unsafe entries present, or not enough room for the unpacked archive: extract only the safe
+        # members, one at a time, moving each to Drive before the next - disk holds one file at most
+        reason = "unsafe entries skipped" if not contained else f"{unpacked / 1024**3:.1f} GB unpacked won't fit on disk"
+        print(f"   📄 Extracting {len(wanted)} files one at a time ({reason})...")
+        for name, size in wanted:
+            if size < min_bytes and not name.endswith(keep_exts):
+                extracted_count += 1; continue  # Would be dropped anyway - don't write it
+            if archive_tool == 'unrar': cmd = ['unrar', 'x', '-o+', '-inul', file_path, name, extract_temp + os.sep]
+            else: cmd = ['7z', 'x', '-y', '-bso0', '-bsp0', '-spd', file_path, f'-o{extract_temp}', name]  # -spd: name is literal, not a wildcard
+            try: rc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode
+            except Exception: rc = -1
+            if rc != 0:
+                failed_runs += 1
+                print(f"      ⚠️ Extractor reported errors (exit code {rc}) - not moving: {name}")
+                for entry in iter_extracted_files(extract_temp): os.remove(entry.path)
+                continue
+            for job in plan(list(iter_extracted_files(extract_temp))): place(job)
 
-    os.remove(file_path)
-    if os.path.exists(extract_temp): shutil.rmtree(extract_temp)
+    shutil.rmtree(extract_temp, ignore_errors=True)
     with progress_lock:
         progress_bar.description = "Idle"
+    if failed_runs:
+        # Keep the only intact copy so the archive can be re-extracted or repaired
+        print(f"   ⚠️ Extraction incomplete: {placed} files moved to Drive, archive kept at {file_path}")
+        return
+    os.remove(file_path)
     print(f"   ✅ Extraction complete: {extracted_count} files processed")
 
+def json_body(r: requests.Response) -> Any:
+    """Decode a JSON response straight from its bytes with orjson when available, else via requests."""
+    return orjson.loads(r.content) if orjson else r.json()
+
 def get_gofile_session(token: Optional[str]) -> Tuple[requests.Session, dict]:
     s = requests.Session()
     s.headers.update({'User-Agent': 'Mozilla/5.0'})
+    # One pooled client for all resolver threads; 429s are retried on the same kept-alive connection
+    retry = Retry(total=3, status_forcelist=[429], backoff_factor=2, respect_retry_after_header=True,
+                  allowed_methods=None, raise_on_status=False)
+    s.mount('https://', HTTPAdapter(pool_maxsize=MAX_RESOLVE_WORKERS, max_retries=retry))
     t = {'token': token, 'wt': "4fd6sg89d7s6"}
     if not token:
         try: 
@@ -1062,12 +1420,17 @@ def get_gofile_session(token: Optional[str]) -> Tuple[requests.Session, dict]:
 
 def resolve_gofile(url, s, t) -> List[Tuple[str, str]]:
     try:
-        match = re.search(r'gofile\.io/d/([a-zA-Z0-9]+)', url)
+        match = _RE_GOFILE_ID.search(url)
         if not match: return []
         r = s.get(f"https://api.gofile.io/contents/{match.group(1)}", 
                   params={'wt': t['wt']}, headers={'Authorization': f"Bearer {t['token']}"}, timeout=30)
-        data = r.json()
-        if data['status'] == 'ok': return [(c['link'], c['name']) for c in data['data']['children'].values() if c.get('link')]
+        data = json_body(r)
+        if data['status'] == 'ok':
+            files = []
+            for c in data['data']['children'].values():
+                link, name = c.get('link'), c.get('name')
+                if link and name: files.append((link, name))
+            return files
         else:
             print(f"   ❌ Gofile Error: {data.get('status', 'unknown')} - Check if link is valid or requires authentication")
     except Exception as e:
@@ -1076,36 +1439,114 @@ def resolve_gofile(url, s, t) -> List[Tuple[str, str]]:
 
 def resolve_pixeldrain(url, s) -> List[Tuple[str, str]]:
     try:
-        fid = re.search(r'pixeldrain\.com/u/([a-zA-Z0-9]+)', url).group(1)
-        name = s.get(f"https://pixeldrain.com/api/file/{fid}/info", timeout=30).json().get('name', f"pixeldrain_{fid}")
+        fid = _RE_PIXELDRAIN_ID.search(url).group(1)
+        # The info call rides the shared keep-alive session and is what names (and so routes) the file
+        r = s.get(f"https://pixeldrain.com/api/file/{fid}/info", timeout=30)
+        if r.status_code == 404:
+            print(f"   ❌ Pixeldrain: file {fid} not found - skipping")
+            return []
+        name = r.json().get('name', f"pixeldrain_{fid}")
         return [(f"https://pixeldrain.com/api/file/{fid}?download", sanitize_filename(name))]
     except Exception as e:
         print(f"   ❌ Pixeldrain Error: {str(e)[:80]} - File may not exist or be private")
     return []
 
-def process_rd_link(link, key):
-    h = {"Authorization": f"Bearer {key}"}
-    if "magnet:?" in link:
-        print("   🧲 Resolving Magnet...")
+# Shared Real-Debrid client: keep-alive + pooled connections across unrestrict/poll calls.
+# Auth is passed per request since resolvers run on several threads at once.
+rd_session = requests.Session()
+# Transient 5xx errors on GETs (status polls) are retried on the kept-alive connection; POSTs such as
+# addMagnet aren't in urllib3's default allowed_methods, so a retry can never queue the same torrent twice
+rd_session.mount('https://', HTTPAdapter(pool_connections=8, pool_maxsize=16, max_retries=Retry(
+    total=3, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504], raise_on_status=False)))
+
+@lru_cache(maxsize=4)
+def rd_auth(key: str) -> Dict[str, str]:
+    """Authorization header for an RD token, built once per token and shared read-only."""
+    return {"Authorization": f"Bearer {key}"}
+
+def add_rd_magnet(link: str, key: str) -> Optional[str]:
+    """Queue a magnet on Real-Debrid with all files selected. Returns the torrent id."""
+    h = rd_auth(key)
+    try:
+        r = rd_session.post(f"{RD_API}/torrents/addMagnet", data={"magnet": link}, headers=h, timeout=30).json()
+        if 'error' in r:
+            print(f"   ❌ RD Magnet Error: {r.get('error', 'Unknown')} - Check token or magnet validity")
+            return None
+        rd_session.post(f"{RD_API}/torrents/selectFiles/{r['id']}", data={"files": "all"}, headers=h, timeout=30)
+        return r['id']
+    except Exception as e:
+        print(f"   ❌ RD Magnet Error: {str(e)[:80]}")
+    return None
+
+def fetch_rd_torrent(links: List[str], key: str):
+    """Unrestrict a finished torrent's links, then download and process them."""
+    # Unrestrict every file first (concurrently, over the pooled session), then fetch them all with one aria2 process
+    with ThreadPoolExecutor(max_workers=MAX_RESOLVE_WORKERS) as executor:
+        resolved = [t for ts in executor.map(lambda l: resolve_rd_link(l, key), links) for t in ts]
+    for f in download_batch_with_aria2(resolved, COLAB_ROOT):
+        handle_file_processing(f)
+
+def process_rd_magnets(magnets: List[str], key: str) -> Set[str]:
+    """Add every magnet up front, then watch them all through the one /torrents listing call per poll.
+    Returns the magnets that were cached and fetched."""
+    h = rd_auth(key)
+    link_for: Dict[str, str] = {}  # RD torrent id -> magnet
+    for i, link in enumerate(magnets, 1):
+        print(f"   🧲 [{i}/{len(magnets)}] Adding magnet {link[:60]}...")
+        tid = add_rd_magnet(link, key)
+        if tid: link_for[tid] = link
+    waiting = set(link_for)
+    fetched: Set[str] = set()
+    # Back off between status polls (2s, 4s, 8s... capped, with jitter) to spare the API quota
+    delay = 2
+    deadline = time.monotonic() + RD_MAGNET_TIMEOUT
+    while waiting:
+        wait = delay + random.uniform(0, delay * 0.1)
+        listing = []
         try:
-            r = requests.post("https://api.real-debrid.com/rest/1.0/torrents/addMagnet", data={"magnet": link}, headers=h, timeout=30).json()
-            if 'error' in r:
-                print(f"   ❌ RD Magnet Error: {r.get('error', 'Unknown')} - Check token or magnet validity")
-                return
-            requests.post(f"https://api.real-debrid.com/rest/1.0/torrents/selectFiles/{r['id']}", data={"files": "all"}, headers=h, timeout=30)
-            for _ in range(30):
-                i = requests.get(f"https://api.real-debrid.com/rest/1.0/torrents/info/{r['id']}", headers=h, timeout=30).json()
-                if i['status'] == 'downloaded':
-                    for l in i['links']:
-                        process_rd_link(l, key)
-                    return
-                time.sleep(2)
-            print("   ❌ RD Timeout - Torrent took too long to download")
+            resp = rd_session.get(f"{RD_API}/torrents", params={'limit': 100}, headers=h, timeout=30)
+            if resp.status_code == 429:
+                # Rate limited - honour the server's Retry-After instead of our own schedule
+                try: wait = float(resp.headers.get('Retry-After', delay))
+                except ValueError: wait = delay
+            else:
+                resp.raise_for_status()
+                listing = json_body(resp)
+                delay = min(delay * 2, RD_POLL_MAX_DELAY)
         except Exception as e:
-            print(f"   ❌ RD Magnet Error: {str(e)[:80]}")
+            # One failed poll costs one attempt, not every magnet still waiting
+            print(f"   ⚠️ RD status check failed: {str(e)[:80]} - retrying")
+            delay = min(delay * 2, RD_POLL_MAX_DELAY)
+        for info in listing:
+            tid = info.get('id')
+            if tid not in waiting: continue
+            if info['status'] == 'downloaded':
+                waiting.discard(tid)
+                print(f"   ✅ RD cached: {info.get('filename', tid)}")
+                started = time.monotonic()
+                try:
+                    fetch_rd_torrent(info.get('links', []), key)
+                    fetched.add(link_for[tid])
+                except Exception as e:
+                    print(f"   ❌ RD Download Error ({info.get('filename', tid)}): {str(e)[:80]}")
+                deadline += time.monotonic() - started  # Time spent downloading isn't time waiting on RD
+            elif info['status'] in RD_DEAD_STATUSES:
+                waiting.discard(tid)
+                print(f"   ❌ RD Torrent Error: status '{info['status']}' - Magnet cannot be cached")
+        if not waiting: break
+        remaining = deadline - time.monotonic()
+        if remaining <= 0: break
+        time.sleep(min(wait, remaining))  # Never overshoot: the last poll lands on the deadline itself
+    if waiting: print(f"   ❌ RD Timeout - {len(waiting)} torrent(s) took too long to download")
+    return fetched
+
+def process_rd_link(link, key):
+    if "magnet:?" in link:
+        process_rd_magnets([link], key)
         return
+    h = rd_auth(key)
     try:
-        d = requests.post("https://api.real-debrid.com/rest/1.0/unrestrict/link", data={"link": link}, headers=h, timeout=30).json()
+        d = rd_session.post(f"{RD_API}/unrestrict/link", data={"link": link}, headers=h, timeout=30).json()
         if 'error' in d:
             print(f"   ❌ RD Unrestrict Error: {d.get('error', 'Unknown')} - Check if link is supported")
             return
@@ -1120,9 +1561,8 @@ def resolve_rd_link(url: str, rd_key: str) -> List[Tuple[str, str]]:
         print(f"   ❌ RD Token required for: {url}")
         return []
     try:
-        h = {"Authorization": f"Bearer {rd_key}"}
-        d = requests.post("https://api.real-debrid.com/rest/1.0/unrestrict/link", 
-                         data={"link": url}, headers=h, timeout=30).json()
+        d = rd_session.post(f"{RD_API}/unrestrict/link", 
+                           data={"link": url}, headers=rd_auth(rd_key), timeout=30).json()
         if 'error' in d:
             print(f"   ❌ RD Unrestrict Error: {d.get('error', 'Unknown')}")
             return []
@@ -1136,21 +1576,20 @@ def resolve_mediafire(url: str, session: requests.Session) -> List[Tuple[str, st
     try:
         resp = session.get(url, timeout=30)
         # Look for the download button href
-        match = re.search(r'href="(https://download\d*\.mediafire\.com/[^"]+)"', resp.text)
+        match = _RE_MEDIAFIRE_LINK.search(resp.text)
         if match:
             download_url = match.group(1)
             # Extract filename from URL or page title
-            filename_match = re.search(r'/([^/]+)$', download_url)
-            if filename_match:
-                filename = unquote(filename_match.group(1))
+            tail = url_basename(download_url)
+            if tail:
+                filename = sanitize_filename(tail)
                 print(f"   📁 MediaFire: {filename}")
-                return [(download_url, sanitize_filename(filename))]
+                return [(download_url, filename)]
         # Try alternate pattern for older MediaFire pages
-        match2 = re.search(r'aria-label="Download file"\s+href="([^"]+)"', resp.text)
-        if match2:
+        match2 = _RE_MEDIAFIRE_ALT_LINK.search(resp.text)
+        if match2 and url_basename(match2.group(1)):
             download_url = match2.group(1)
-            filename = re.search(r'/([^/]+)$', download_url).group(1)
-            return [(download_url, sanitize_filename(unquote(filename)))]
+            return [(download_url, sanitize_filename(url_basename(download_url)))]
         print(f"   ⚠️ MediaFire: Could not find download link")
     except Exception as e:
         print(f"   ❌ MediaFire Error: {str(e)[:80]}")
@@ -1163,12 +1602,12 @@ def resolve_1fichier(url: str, session: requests.Session) -> List[Tuple[str, str
         resp = session.get(url, timeout=30)
         
         # Extract filename from page
-        filename_match = re.search(r'<title>([^<]+)</title>', resp.text)
+        filename_match = _RE_HTML_TITLE.search(resp.text)
         filename = "1fichier_download"
         if filename_match:
             title = filename_match.group(1)
             # Clean up title (remove "1fichier.com:" prefix if present)
-            filename = re.sub(r'^.*?:\s*', '', title).strip()
+            filename = _RE_TITLE_PREFIX.sub('', title, count=1).strip()
             if not filename or filename == "1fichier.com":
                 filename = "1fichier_download"
         
@@ -1190,7 +1629,7 @@ def resolve_1fichier(url: str, session: requests.Session) -> List[Tuple[str, str
                 return [(download_url, sanitize_filename(filename))]
         
         # Check response for direct link
-        dl_match = re.search(r'href="(https://[^"]*1fichier[^"]*)"[^>]*>Click here', post_resp.text, re.IGNORECASE)
+        dl_match = _RE_1FICHIER_LINK.search(post_resp.text)
         if dl_match:
             return [(dl_match.group(1), sanitize_filename(filename))]
         
@@ -1200,12 +1639,17 @@ def resolve_1fichier(url: str, session: requests.Session) -> List[Tuple[str, str
     return []
 
 # --- PARALLEL DOWNLOAD WORKER ---
-def download_worker(task: DownloadTask, gofile_token: str) -> DownloadTask:
-    """Worker function for parallel downloads. Returns updated task."""
+def download_worker(task: DownloadTask, gofile_token: str, post_queue: Optional[Queue] = None, parallel: int = 1) -> DownloadTask:
+    """Worker function for parallel downloads. Returns updated task.
+    With a post_queue, extraction/moving is handed off so this slot can start the next download.
+    `parallel` is how many downloads actually run side by side (for the aria2 connection split)."""
     task.status = "downloading"
     try:
-        f = download_with_aria2(task.url, task.filename, COLAB_ROOT, task.cookie, task_id=task.id)
-        if f:
+        f = download_with_aria2(task.url, task.filename, COLAB_ROOT, task.cookie, task_id=task.id, parallel=parallel)
+        if f and post_queue is not None:
+            task.status = "processing"
+            post_queue.put((f, task))
+        elif f:
             handle_file_processing(f, source=task.source)
             task.status = "done"
         else:
@@ -1216,95 +1660,144 @@ def download_worker(task: DownloadTask, gofile_token: str) -> DownloadTask:
         task.error = str(e)[:100]
     return task
 
-def resolve_all_links(urls: List[str], session: requests.Session, tokens: dict, rd_key: str) -> Tuple[List[DownloadTask], List[str], List[str], List[str]]:
+def post_process_worker(post_queue: Queue):
+    """Extract/move finished downloads one at a time while the pool keeps downloading. Stops on None."""
+    while True:
+        item = post_queue.get()
+        if item is None: break
+        file_path, task = item
+        try:
+            handle_file_processing(file_path, source=task.source)
+            task.status = "done"
+        except Exception as e:
+            print(f"   ❌ Processing failed for {task.filename}: {str(e)[:80]}")
+            task.status = "failed"
+            task.error = str(e)[:100]
+
+def start_post_processor() -> Tuple[Queue, Thread]:
+    """Start the single post-processing consumer used by the parallel download stage."""
+    post_queue: Queue = Queue()
+    post_thread = Thread(target=post_process_worker, args=(post_queue,), daemon=True)
+    post_thread.start()
+    return post_queue, post_thread
+
+def stop_post_processor(post_queue: Queue, post_thread: Thread):
+    """Let the consumer drain what is queued, then wait for it to exit."""
+    post_queue.put(None)
+    post_thread.join()
+
+def resolve_link(url: str, session: requests.Session, tokens: dict, rd_key: str) -> Tuple[str, List[DownloadTask]]:
     """
-    Pre-resolve all links into DownloadTasks.
-    Returns: (parallel_tasks, youtube_urls, mega_urls, rd_urls)
+    Classify and resolve a single link.
+    Returns: (kind, tasks) where kind is "parallel", "youtube", "mega" or "rd"
     """
-    parallel_tasks: List[DownloadTask] = []
-    youtube_urls: List[str] = []
-    mega_urls: List[str] = []
-    rd_urls: List[str] = []
-    
-    for url in urls:
-        if "mega.nz" in url or "transfer.it" in url:
-            mega_urls.append(url)
-        elif any(h in url for h in ['youtube.com', 'youtu.be', 'vimeo.com', 'twitch.tv']):
-            youtube_urls.append(url)
-        elif "gofile.io" in url:
-            resolved = resolve_gofile(url, session, tokens)
+    tasks: List[DownloadTask] = []
+    m = _RE_LINK_HOST.search(url)
+    host_kind = LINK_HOST_KINDS[m.group(1).lower()] if m else None
+    if host_kind == "mega":
+        return "mega", []
+    elif host_kind == "youtube":
+        return "youtube", []
+    elif host_kind == "gofile":
+        resolved = resolve_gofile(url, session, tokens)
+        for u, n in resolved:
+            tasks.append(DownloadTask(
+                url=u, filename=n, source="gofile", link_type="gofile",
+                cookie=tokens.get('token'), original_url=url  # Store original for re-resolve
+            ))
+    elif host_kind == "pixeldrain":
+        resolved = resolve_pixeldrain(url, session)
+        for u, n in resolved:
+            tasks.append(DownloadTask(
+                url=u, filename=n, source="pixeldrain", link_type="pixeldrain",
+                original_url=url  # Store original for re-resolve
+            ))
+    elif host_kind == "mediafire":
+        # Prefer RD if available, fallback to direct resolve
+        if rd_key:
+            resolved = resolve_rd_link(url, rd_key)
             for u, n in resolved:
-                parallel_tasks.append(DownloadTask(
-                    url=u, filename=n, source="gofile", link_type="gofile",
-                    cookie=tokens.get('token'), original_url=url  # Store original for re-resolve
+                tasks.append(DownloadTask(
+                    url=u, filename=n, source="mediafire", link_type="rd",
+                    original_url=url
                 ))
-        elif "pixeldrain.com" in url:
-            resolved = resolve_pixeldrain(url, session)
+        else:
+            resolved = resolve_mediafire(url, session)
             for u, n in resolved:
-                parallel_tasks.append(DownloadTask(
-                    url=u, filename=n, source="pixeldrain", link_type="pixeldrain",
-                    original_url=url  # Store original for re-resolve
+                tasks.append(DownloadTask(
+                    url=u, filename=n, source="mediafire", link_type="mediafire",
+                    original_url=url
                 ))
-        elif "mediafire.com" in url:
-            # Prefer RD if available, fallback to direct resolve
-            if rd_key:
-                resolved = resolve_rd_link(url, rd_key)
-                for u, n in resolved:
-                    parallel_tasks.append(DownloadTask(
-                        url=u, filename=n, source="mediafire", link_type="rd",
-                        original_url=url
-                    ))
-            else:
-                resolved = resolve_mediafire(url, session)
-                for u, n in resolved:
-                    parallel_tasks.append(DownloadTask(
-                        url=u, filename=n, source="mediafire", link_type="mediafire",
-                        original_url=url
-                    ))
-        elif "1fichier.com" in url:
-            # Prefer RD if available, fallback to direct resolve
-            if rd_key:
-                resolved = resolve_rd_link(url, rd_key)
-                for u, n in resolved:
-                    parallel_tasks.append(DownloadTask(
-                        url=u, filename=n, source="1fichier", link_type="rd",
-                        original_url=url
-                    ))
-            else:
-                resolved = resolve_1fichier(url, session)
-                for u, n in resolved:
-                    parallel_tasks.append(DownloadTask(
-                        url=u, filename=n, source="1fichier", link_type="1fichier",
-                        original_url=url
-                    ))
-        elif "magnet:?" in url:
-            # Magnets stay sequential (need to wait for RD to cache)
-            rd_urls.append(url)
-        elif "real-debrid.com/d/" in url:
-            # RD direct links can be parallelized
+    elif host_kind == "1fichier":
+        # Prefer RD if available, fallback to direct resolve
+        if rd_key:
             resolved = resolve_rd_link(url, rd_key)
             for u, n in resolved:
-                parallel_tasks.append(DownloadTask(
-                    url=u, filename=n, source="rd", link_type="rd",
-                    original_url=url  # Store original for re-resolve
+                tasks.append(DownloadTask(
+                    url=u, filename=n, source="1fichier", link_type="rd",
+                    original_url=url
                 ))
-        elif rd_key and any(host in url for host in RD_SUPPORTED_HOSTS):
-            # Route through RD for any supported premium host
-            resolved = resolve_rd_link(url, rd_key)
+        else:
+            resolved = resolve_1fichier(url, session)
             for u, n in resolved:
-                parallel_tasks.append(DownloadTask(
-                    url=u, filename=n, source="rd_host", link_type="rd",
+                tasks.append(DownloadTask(
+                    url=u, filename=n, source="1fichier", link_type="1fichier",
                     original_url=url
                 ))
-        elif rd_key and "http" in url:
-            # Other links through RD - try unrestricting
-            rd_urls.append(url)
-        else:
-            # Direct URL
-            filename = os.path.basename(unquote(urlparse(url).path)) or "download"
-            parallel_tasks.append(DownloadTask(
-                url=url, filename=filename, source="direct", link_type="direct"
+    elif host_kind == "magnet":
+        # Magnets stay sequential (need to wait for RD to cache)
+        return "rd", []
+    elif host_kind == "rd":
+        # RD direct links can be parallelized
+        resolved = resolve_rd_link(url, rd_key)
+        for u, n in resolved:
+            tasks.append(DownloadTask(
+                url=u, filename=n, source="rd", link_type="rd",
+                original_url=url  # Store original for re-resolve
+            ))
+    elif rd_key and _RE_RD_HOST.search(url):
+        # Route through RD for any supported premium host
+        resolved = resolve_rd_link(url, rd_key)
+        for u, n in resolved:
+            tasks.append(DownloadTask(
+                url=u, filename=n, source="rd_host", link_type="rd",
+                original_url=url
+            ))
+    else:
+        # Other links through RD - unrestrict now so they join the parallel pool instead of queueing one by one
+        resolved = resolve_rd_link(url, rd_key) if rd_key and "http" in url else []
+        for u, n in resolved:
+            tasks.append(DownloadTask(
+                url=u, filename=n, source="rd", link_type="rd",
+                original_url=url
             ))
+        if not resolved:
+            # Direct URL (also hosts RD can't unrestrict - fall back instead of dropping the link)
+            if rd_key and "http" in url: print(f"   ↪️ Not available through RD - downloading directly: {url[:60]}")
+            tasks.append(DownloadTask(  # Raw name - download_with_aria2 sanitizes it
+                url=url, filename=url_basename(url) or "download", source="direct", link_type="direct"
+            ))
+    return "parallel", tasks
+
+def resolve_all_links(urls: List[str], session: requests.Session, tokens: dict, rd_key: str) -> Tuple[List[DownloadTask], List[str], List[str], List[str]]:
+    """
+    Pre-resolve all links into DownloadTasks.
+    Returns: (parallel_tasks, youtube_urls, mega_urls, rd_urls)
+    """
+    parallel_tasks: List[DownloadTask] = []
+    youtube_urls: List[str] = []
+    mega_urls: List[str] = []
+    rd_urls: List[str] = []
+    
+    # Resolver calls are network-bound, so overlap them; map() keeps the input order
+    with ThreadPoolExecutor(max_workers=MAX_RESOLVE_WORKERS) as executor:
+        results = list(executor.map(lambda u: resolve_link(u, session, tokens, rd_key), urls))
+    
+    for url, (kind, tasks) in zip(urls, results):
+        if kind == "youtube": youtube_urls.append(url)
+        elif kind == "mega": mega_urls.append(url)
+        elif kind == "rd": rd_urls.append(url)
+        else: parallel_tasks.extend(tasks)
     
     return parallel_tasks, youtube_urls, mega_urls, rd_urls
 
@@ -1324,7 +1817,7 @@ def update_progress_display(tasks: List[DownloadTask]):
         status = active_downloads.get(t.id, "0%")
         active_infos.append(status)
         # Extract percentage from status like "45% (5.2MiB/s)"
-        match = re.search(r'(\d+)%', status)
+        match = _RE_STATUS_PERCENT.search(status)
         if match:
             active_progress += float(match.group(1)) / total
     
@@ -1341,7 +1834,7 @@ def update_progress_display(tasks: List[DownloadTask]):
     else:
         progress_bar.description = f"DL [{done}/{total}]"
 
-def progress_monitor(tasks: List[DownloadTask], interval: float = 0.5):
+def progress_monitor(tasks: List[DownloadTask], interval: float = PROGRESS_INTERVAL):
     """Background thread to update progress display periodically."""
     global stop_monitor
     while not stop_monitor:
@@ -1385,11 +1878,14 @@ def execute_selected_tasks(selected_tasks: List[DownloadTask], mode: str):
             import threading
             monitor_thread = threading.Thread(target=progress_monitor, args=(parallel_tasks,), daemon=True)
             monitor_thread.start()
+            # Downloads and extraction/moving overlap: workers hand finished files to one consumer
+            post_queue, post_thread = start_post_processor()
             
             try:
+                running = min(max_workers, len(parallel_tasks))  # A lone download keeps the full connection budget
                 with ThreadPoolExecutor(max_workers=max_workers) as executor:
                     future_to_task = {
-                        executor.submit(download_worker, task, gofile_token): task 
+                        executor.submit(download_worker, task, gofile_token, post_queue, running): task 
                         for task in parallel_tasks
                     }
                     
@@ -1405,7 +1901,9 @@ def execute_selected_tasks(selected_tasks: List[DownloadTask], mode: str):
                         except Exception as e:
                             print(f"   ❌ Task failed: {str(e)[:80]}")
             finally:
+                stop_post_processor(post_queue, post_thread)
                 stop_monitor = True
+            save_session(all_tasks, gofile_token, rd_key, show_name_override.value.strip(), playlist_selection.value.strip())
             
             print(f"✅ Parallel downloads complete!")
         
@@ -1450,23 +1948,15 @@ def execute_selected_tasks(selected_tasks: List[DownloadTask], mode: str):
         
         if rd_urls and rd_key:
             print(f"\n⚡ Processing {len(rd_urls)} RD Magnet links...")
-            for i, url in enumerate(rd_urls, 1):
-                print(f"   [{i}/{len(rd_urls)}] {url[:60]}...")
-                process_rd_link(url, rd_key)
-                # Mark as done in task list
-                for t in all_tasks:
-                    if t.url == url and t.link_type == 'magnet':
-                        t.status = "done"
-                        break
+            fetched = process_rd_magnets(rd_urls, rd_key)
+            # Mark each magnet by its own outcome so failures stay retryable
+            for t in all_tasks:
+                if t.url in rd_urls and t.link_type == 'magnet':
+                    t.status = "done" if t.url in fetched else "failed"
 
         
         # Summary - include YouTube individual video counts
-        done_count = sum(1 for t in all_tasks if t.status == 'done')
-        failed_count = sum(1 for t in all_tasks if t.status == 'failed')
-        
-        # For display, use cumulative YouTube individual counts
-        total_success = done_count - len([t for t in all_tasks if t.link_type == 'youtube' and t.status == 'done']) + yt_success_cumulative
-        total_failed = failed_count - len([t for t in all_tasks if t.link_type == 'youtube' and t.status == 'failed']) + yt_fail_cumulative
+        total_success, total_failed = count_results(all_tasks, yt_success_cumulative, yt_fail_cumulative)
         
         if total_failed > 0:
             print(f"\n⚠️ Completed with {total_success} success, {total_failed} failed")
@@ -1529,14 +2019,15 @@ def execute_batch(mode: str, resume: bool = False):
             all_tasks = [DownloadTask(**t) for t in session_data.get('tasks', [])]
             
             # Filter to only pending/failed tasks
-            pending_tasks = [t for t in all_tasks if t.status in ['pending', 'failed']]
+            pending_tasks = [t for t in all_tasks if t.status in ['pending', 'failed', 'processing']]
             print(f"📂 Resuming {len(pending_tasks)} of {len(all_tasks)} tasks...")
             
             # Install required tools first
-            needs_pixeldrain_gofile_rd = any(t.link_type in ['gofile', 'pixeldrain', 'rd'] for t in pending_tasks)
-            needs_ytdlp = any(t.link_type == 'youtube' for t in pending_tasks)
-            needs_mega = any(t.link_type == 'mega' for t in pending_tasks)
-            needs_aria = any(t.link_type in ['gofile', 'pixeldrain', 'direct', 'rd'] for t in pending_tasks)
+            link_types = {t.link_type for t in pending_tasks}  # One pass; each check below is a set test
+            needs_pixeldrain_gofile_rd = not link_types.isdisjoint({'gofile', 'pixeldrain', 'rd'})
+            needs_ytdlp = 'youtube' in link_types
+            needs_mega = 'mega' in link_types
+            needs_aria = not link_types.isdisjoint({'gofile', 'pixeldrain', 'direct', 'rd', 'magnet'})
             setup_environment(needs_mega, needs_ytdlp, needs_aria)
             
             # Re-resolve Gofile/Pixeldrain/RD URLs to get fresh API tokens (bypasses IP rate limits)
@@ -1576,9 +2067,10 @@ def execute_batch(mode: str, resume: bool = False):
                 btn_subs.disabled = False
                 return
             
-            needs_ytdlp = any(h in u for u in urls for h in ['youtube.com', 'youtu.be', 'twitch.tv', 'tiktok.com', 'vimeo.com', 'dailymotion.com', 'soundcloud.com'])
-            needs_mega = any("mega.nz" in u or "transfer.it" in u for u in urls)
-            needs_aria = not (needs_ytdlp and not needs_mega) or any(h in u for u in urls for h in ["gofile.io", "pixeldrain.com", "magnet:", "real-debrid"])
+            joined = "\n".join(urls)  # One C-level scan per check instead of a Python loop over every url x host
+            needs_ytdlp = bool(_RE_YTDLP_HOST.search(joined))
+            needs_mega = "mega.nz" in joined or "transfer.it" in joined
+            needs_aria = not (needs_ytdlp and not needs_mega) or bool(_RE_ARIA_HOST.search(joined))
             
             setup_environment(needs_mega, needs_ytdlp, needs_aria)
             
@@ -1594,7 +2086,7 @@ def execute_batch(mode: str, resume: bool = False):
             for url in mega_urls:
                 all_tasks.append(DownloadTask(url=url, filename="", source="mega", link_type="mega"))
             for url in rd_urls:
-                all_tasks.append(DownloadTask(url=url, filename="", source="rd", link_type="rd"))
+                all_tasks.append(DownloadTask(url=url, filename="", source="rd", link_type="magnet"))
             
             # Save initial session
             save_session(all_tasks, gofile_token, rd_key, show_name_override.value.strip(), playlist_selection.value.strip())
@@ -1618,11 +2110,14 @@ def execute_batch(mode: str, resume: bool = False):
             import threading
             monitor_thread = threading.Thread(target=progress_monitor, args=(parallel_tasks,), daemon=True)
             monitor_thread.start()
+            # Downloads and extraction/moving overlap: workers hand finished files to one consumer
+            post_queue, post_thread = start_post_processor()
             
             try:
+                running = min(max_workers, len(parallel_tasks))  # A lone download keeps the full connection budget
                 with ThreadPoolExecutor(max_workers=max_workers) as executor:
                     future_to_task = {
-                        executor.submit(download_worker, task, gofile_token): task 
+                        executor.submit(download_worker, task, gofile_token, post_queue, running): task 
                         for task in parallel_tasks
                     }
                     
@@ -1643,15 +2138,20 @@ def execute_batch(mode: str, resume: bool = False):
                             task.status = "failed"
                             task.error = str(e)[:100]
             finally:
+                stop_post_processor(post_queue, post_thread)
                 # Stop progress monitor
                 stop_monitor = True
                 time.sleep(0.6)  # Let monitor thread exit
+            save_session(all_tasks, gofile_token, rd_key, show_name_override.value.strip(), playlist_selection.value.strip())
             
             # Final progress update
             update_progress_display(parallel_tasks)
             print(f"✅ Parallel downloads complete\n")
         
         # --- SEQUENTIAL DOWNLOADS (YouTube, Mega, RD) ---
+        # url -> its (first) task, so marking each link done is a lookup instead of a scan of every task
+        task_for_url: Dict[str, DownloadTask] = {}
+        for t in all_tasks: task_for_url.setdefault(t.url, t)
         yt_success = 0
         yt_fail = 0
         if youtube_urls:
@@ -1663,10 +2163,7 @@ def execute_batch(mode: str, resume: bool = False):
                 yt_success_cumulative += s
                 yt_fail_cumulative += f
                 # Mark task status based on THIS run's results
-                for t in all_tasks:
-                    if t.url == url:
-                        t.status = "done" if f == 0 else "failed"
-                        break
+                if url in task_for_url: task_for_url[url].status = "done" if f == 0 else "failed"
                 save_session(all_tasks, gofile_token, rd_key, show_name_override.value.strip(), playlist_selection.value.strip(), yt_success_cumulative, yt_fail_cumulative)
             
             # If ALL YouTube processing in this run succeeded, ensure all YT tasks are marked done
@@ -1684,32 +2181,26 @@ def execute_batch(mode: str, resume: bool = False):
             print(f"☁️ Processing {len(mega_urls)} Mega links...")
             for url in mega_urls:
                 process_mega_link(url)
-                for t in all_tasks:
-                    if t.url == url:
-                        t.status = "done"
-                        break
+                if url in task_for_url: task_for_url[url].status = "done"
                 save_session(all_tasks, gofile_token, rd_key, show_name_override.value.strip(), playlist_selection.value.strip())
         
         if rd_urls:
             print(f"🔓 Processing {len(rd_urls)} RD links...")
+            # Magnets are queued together so RD caches them in parallel and one listing call polls them all
+            magnets = [u for u in rd_urls if "magnet:?" in u]
+            fetched = process_rd_magnets(magnets, rd_key) if magnets and rd_key else set()
+            magnet_set = set(magnets)
             for url in rd_urls:
-                if rd_key:
-                    process_rd_link(url, rd_key)
-                else:
+                ok = bool(rd_key)
+                if not rd_key:
                     print("   ❌ RD Token Required for magnets/premium links")
-                for t in all_tasks:
-                    if t.url == url:
-                        t.status = "done"
-                        break
+                elif url in magnet_set: ok = url in fetched
+                else: process_rd_link(url, rd_key)
+                if url in task_for_url: task_for_url[url].status = "done" if ok else "failed"
                 save_session(all_tasks, gofile_token, rd_key, show_name_override.value.strip(), playlist_selection.value.strip())
         
         # Check for failures - include YouTube individual video counts (cumulative across resume)
-        failed_count = sum(1 for t in all_tasks if t.status == "failed")
-        done_count = sum(1 for t in all_tasks if t.status == "done")
-        
-        # For display, use CUMULATIVE YouTube individual counts instead of just this run
-        total_success = done_count - len([t for t in all_tasks if t.link_type == 'youtube' and t.status == 'done']) + yt_success_cumulative
-        total_failed = failed_count - len([t for t in all_tasks if t.link_type == 'youtube' and t.status == 'failed']) + yt_fail_cumulative
+        total_success, total_failed = count_results(all_tasks, yt_success_cumulative, yt_fail_cumulative)
         
         if total_failed > 0:
             print(f"\n⚠️ Completed with {total_success} success, {total_failed} failed (session saved for retry)")